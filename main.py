@@ -6,29 +6,86 @@
 
 import os
 import sys
+import argparse
 from pathlib import Path
 import yaml
+import json
 import csv
 import re
 
-# Добавляем папку src в путь для импорта модулей
-sys.path.append(str(Path(__file__).parent / 'src'))
-
 from src.data_processor import process_data_files, process_data_files_modelling
-from src.visualization import plot_weighted_std_dependencies, plot_std_vs_w_with_approximation, print_results_summary
+from src.visualization import print_results_summary
 from src.physics_parameters import calculate_relativistic_parameters, calculate_w_parameter
-from src.approximation import fit_parabola_and_calculate_emittance
+from src.approximation import fit_parabola_and_calculate_emittance, fit_parabolas_batched
+
+# Загрузчик YAML на C (LibYAML), если PyYAML собран с ним; иначе чистый Python
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
 
 
 def load_config(config_path="config.yaml"):
-    """Загружает параметры из YAML-конфига"""
+    """
+    Загружает параметры из YAML-конфига.
+    Разобранный конфиг кэшируется в файле <config>.json рядом с YAML вместе
+    с размером и временем изменения YAML-файла: если они совпадают, читается кэш
+    (json.load быстрее разбора YAML).
+    """
+    config_path = Path(config_path)
+    cache_path = config_path.with_suffix(config_path.suffix + ".json")
+    stat = config_path.stat()
+    # Требуем точного совпадения, а не «кэш новее»: YAML, восстановленный с более
+    # старым временем изменения (cp -p, rsync -t, архив), не должен подменяться кэшем
+    source = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        if isinstance(cached, dict) and cached.get("source") == source and "config" in cached:
+            return cached["config"]
+    except (OSError, json.JSONDecodeError):
+        # Нет кэша или он повреждён: разбираем YAML заново, кэш будет перезаписан
+        pass
     with open(config_path, "r", encoding="utf-8") as f:
-        config = yaml.safe_load(f)
+        config = yaml.load(f, Loader=_YamlLoader)
+    try:
+        text = json.dumps({"source": source, "config": config}, ensure_ascii=False)
+    except (TypeError, ValueError):
+        # Значения, которые JSON не представляет (например, даты), — конфиг не кэшируется
+        return config
+    if json.loads(text)["config"] != config:
+        # JSON меняет типы (нестроковые ключи, кортежи) — такой кэш вернул бы другой конфиг
+        return config
+    tmp_path = cache_path.with_suffix(cache_path.suffix + ".tmp")
+    try:
+        # Запись через временный файл: прерванная запись не оставляет обрезанный кэш
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        # Кэш не обязателен: если записать его нельзя, просто работаем без него
+        pass
     return config
 
 
+def parse_args():
+    """Разбирает аргументы командной строки"""
+    parser = argparse.ArgumentParser(description="Калькулятор эмиттанса электронного пучка")
+    parser.add_argument("--no-plots", action="store_true",
+                        help="не строить графики (matplotlib при этом не используется)")
+    parser.add_argument("--no-show", action="store_true",
+                        help="сохранять графики в results/ без вывода на экран (backend Agg)")
+    return parser.parse_args()
+
+
 def main():
     """Основная функция программы"""
+    args = parse_args()
+    make_plots = not args.no_plots
+    show_plots = not args.no_show
+    if make_plots:
+        from src.visualization import plot_weighted_std_dependencies, plot_std_vs_w_with_approximation
+
     print("=" * 60)
     print("КАЛЬКУЛЯТОР ЭМИТТАНСА ЭЛЕКТРОННОГО ПУЧКА")
     print("=" * 60)
@@ -64,27 +121,48 @@ def main():
         print("Ошибка: В config.yaml должны быть заданы и data_files, и field_values! Автоматический парсинг отключён.")
         return
 
+    # Кэш результатов обработки файлов (отключается параметром cache: false)
+    cache_dir = results_dir / ".cache" if config.get("cache", True) else None
+    cache_max_entries = config.get("cache_max_entries", 100)
+    excel_engine = config.get("excel_engine", "calamine")
+    if excel_engine not in ["calamine", "openpyxl"]:
+        print(f"Ошибка: неизвестный движок чтения Excel '{excel_engine}' в config.yaml! Должно быть 'calamine' или 'openpyxl'.")
+        sys.exit(1)
+
     print(f"\n1. ОБРАБОТКА ДАННЫХ... (тип: {data_type})")
     try:
         if data_type == "modelling":
-            weighted_std_col2, weighted_std_col3, field_values = process_data_files_modelling(
+            weighted_std_col2, weighted_std_col3, field_values, row_counts = process_data_files_modelling(
                 data_files=data_files,
                 field_values=field_values,
                 data_folder=data_path,
                 verbose=verbose,
-                data_type=data_type
+                data_type=data_type,
+                cache_dir=cache_dir,
+                cache_max_entries=cache_max_entries,
+                engine=excel_engine
             )
         else:
-            weighted_std_col2, weighted_std_col3, field_values = process_data_files(
+            weighted_std_col2, weighted_std_col3, field_values, row_counts = process_data_files(
                 data_files=data_files,
                 field_values=field_values,
                 data_folder=data_path,
-                verbose=verbose
+                verbose=verbose,
+                cache_dir=cache_dir,
+                cache_max_entries=cache_max_entries,
+                engine=excel_engine
             )
     except Exception as e:
         print(f"ОШИБКА ПРИ ОБРАБОТКЕ ДАННЫХ: {e}")
         return
     
+    # Ненайденные файлы (NaN в массивах результатов) исключаются из дальнейшего расчёта
+    found = [i for i, counts in enumerate(row_counts) if counts is not None]
+    if len(found) < len(row_counts):
+        field_values = [field_values[i] for i in found]
+        weighted_std_col2 = weighted_std_col2[found]
+        weighted_std_col3 = weighted_std_col3[found]
+
     if not field_values:
         print("Ошибка: Не удалось обработать данные!")
         return
@@ -92,31 +170,26 @@ def main():
     # Вывод количества строк с данными для каждого файла (только при verbose=False)
     if not verbose:
         print("Количество строк с данными для каждого файла:")
-        for i, filename in enumerate(data_files):
-            file_path = os.path.join(data_path, filename)
-            if os.path.exists(file_path):
-                import pandas as pd
-                df = pd.read_excel(file_path, header=None)
-                if data_type == "modelling":
-                    valid_col1_mask = df.iloc[:, 0].notna()
-                    valid_col2_mask = df.iloc[:, 1].notna()
-                    print(f"  {filename}: кол-во строк в 1-й колонке: {valid_col1_mask.sum()}, во 2-й колонке: {valid_col2_mask.sum()}")
-                else:
-                    valid_col2_mask = df.iloc[:, 1].notna() & (df.iloc[:, 1] != 0) & df.iloc[:, 0].notna()
-                    valid_col3_mask = df.iloc[:, 2].notna() & (df.iloc[:, 2] != 0) & df.iloc[:, 0].notna()
-                    print(f"  {filename}: кол-во строк во 2-й колонке: {valid_col2_mask.sum()}, в 3-й колонке: {valid_col3_mask.sum()}")
-            else:
+        for filename, counts in zip(data_files, row_counts):
+            if counts is None:
                 print(f"  {filename}: файл не найден!")
+            elif data_type == "modelling":
+                print(f"  {filename}: кол-во строк в 1-й колонке: {counts[0]}, во 2-й колонке: {counts[1]}")
+            else:
+                print(f"  {filename}: кол-во строк во 2-й колонке: {counts[0]}, в 3-й колонке: {counts[1]}")
 
     print_results_summary(field_values, weighted_std_col2, weighted_std_col3)
     
-    print("\n2. ПОСТРОЕНИЕ ГРАФИКОВ ЗАВИСИМОСТИ ОТ FIELD...")
-    plot_weighted_std_dependencies(
-        field_values, 
-        weighted_std_col2, 
-        weighted_std_col3,
-        save_path=results_dir / "std_vs_field.png"
-    )
+    if make_plots:
+        print("\n2. ПОСТРОЕНИЕ ГРАФИКОВ ЗАВИСИМОСТИ ОТ FIELD...")
+        plot_weighted_std_dependencies(
+            field_values, 
+            weighted_std_col2, 
+            weighted_std_col3,
+            save_path=results_dir / "std_vs_field.png",
+            show_plot=show_plots,
+            annotate_all=verbose
+        )
     
     # Физические параметры теперь из конфига
     d = config["drift_length"]
@@ -137,18 +210,32 @@ def main():
     print(f"Значения параметра w: {[f'{w:.6f}' for w in w_values]}")
     
     print(f"\n4. АППРОКСИМАЦИЯ И РАСЧЕТ ЭМИТТАНСА...")
-    emittance_x_result = fit_parabola_and_calculate_emittance(w_values, weighted_std_col2, d, gamma, beta, axis_name="x", verbose=verbose)
-    emittance_y_result = fit_parabola_and_calculate_emittance(w_values, weighted_std_col3, d, gamma, beta, axis_name="y", verbose=verbose)
+    # Прореживание точек перед аппроксимацией (только для больших наборов, см. fit_downsample)
+    fit_sample_points = config.get("fit_sample_points", 5) if config.get("fit_downsample", False) else None
+    if fit_sample_points is not None and fit_sample_points < 3:
+        print("Ошибка: В config.yaml параметр fit_sample_points должен быть не меньше 3!")
+        return
+    # Параболы для обеих осей подгоняются одним вызовом МНК на общей сетке w
+    fit_x, fit_y = fit_parabolas_batched(w_values, [weighted_std_col2, weighted_std_col3], fit_sample_points)
+    emittance_x_result = fit_parabola_and_calculate_emittance(w_values, weighted_std_col2, d, gamma, beta, axis_name="x",
+                                                              verbose=verbose, fit_sample_points=fit_sample_points,
+                                                              fit_result=fit_x)
+    emittance_y_result = fit_parabola_and_calculate_emittance(w_values, weighted_std_col3, d, gamma, beta, axis_name="y",
+                                                              verbose=verbose, fit_sample_points=fit_sample_points,
+                                                              fit_result=fit_y)
     
-    print(f"\n5. ПОСТРОЕНИЕ ГРАФИКОВ ЗАВИСИМОСТИ ОТ W С АППРОКСИМАЦИЕЙ...")
-    plot_std_vs_w_with_approximation(
-        w_values,
-        weighted_std_col2,
-        weighted_std_col3,
-        emittance_x_result,
-        emittance_y_result,
-        save_path=results_dir / "std_vs_w_with_approximation.png"
-    )
+    if make_plots:
+        print(f"\n5. ПОСТРОЕНИЕ ГРАФИКОВ ЗАВИСИМОСТИ ОТ W С АППРОКСИМАЦИЕЙ...")
+        plot_std_vs_w_with_approximation(
+            w_values,
+            weighted_std_col2,
+            weighted_std_col3,
+            emittance_x_result,
+            emittance_y_result,
+            save_path=results_dir / "std_vs_w_with_approximation.png",
+            show_plot=show_plots,
+            annotate_all=verbose
+        )
     
     print(f"\n6. ФИНАЛЬНЫЕ РЕЗУЛЬТАТЫ:")
     print("=" * 50)
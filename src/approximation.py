@@ -3,14 +3,20 @@
 Содержит функции для подгонки различных математических функций к данным.
 """
 
+from functools import lru_cache
+
 import numpy as np
-from scipy.optimize import curve_fit
-import matplotlib.pyplot as plt
+
+
+# Прореживание данных перед аппроксимацией включается только при числе точек больше этого порога
+DOWNSAMPLE_MIN_POINTS = 50
 
 
 def quadratic_function(x, a, b, c):
     """
     Квадратичная функция: y = ax² + bx + c
+    Вычисляется по схеме Горнера (ax + b)x + c: умножения вместо возведения в степень,
+    промежуточные операции выполняются на месте в одном выходном массиве
     
     Args:
         x (array): Значения x
@@ -21,7 +27,12 @@ def quadratic_function(x, a, b, c):
     Returns:
         array: Значения функции
     """
-    return a * x**2 + b * x + c
+    x = np.asarray(x, dtype=np.float64)
+    y = a * x
+    y += b
+    y *= x
+    y += c
+    return y
 
 
 def fit_function(x_data, y_data, function, initial_guess=None, bounds=None):
@@ -38,6 +49,8 @@ def fit_function(x_data, y_data, function, initial_guess=None, bounds=None):
     Returns:
         tuple: (оптимальные параметры, ковариационная матрица)
     """
+    # SciPy импортируется только здесь: для параболы он не нужен (см. fit_parabola)
+    from scipy.optimize import curve_fit
     try:
         if bounds is not None:
             popt, pcov = curve_fit(function, x_data, y_data, 
@@ -50,6 +63,111 @@ def fit_function(x_data, y_data, function, initial_guess=None, bounds=None):
         return None, None
 
 
+@lru_cache(maxsize=8)
+def _parabola_pinv(x_tuple):
+    """
+    Строит для сетки x матрицу Вандермонда V, её псевдообратную V⁺ (3×N) и (VᵀV)⁻¹.
+    Результат кэшируется: сетка w обычно общая для осей x, y и повторных расчётов,
+    и тогда подгонка сводится к одному умножению V⁺ · y.
+    Возвращаемые массивы доступны только для чтения, так как разделяются между вызовами.
+    
+    Returns:
+        tuple: (V, V⁺, (VᵀV)⁻¹ или None, если матрица VᵀV вырождена, ранг V)
+    """
+    vander = np.vander(np.array(x_tuple, dtype=np.float64), 3)
+    rank = np.linalg.matrix_rank(vander) if len(x_tuple) else 0
+    pinv = np.linalg.pinv(vander)
+    try:
+        normal_inv = np.linalg.inv(vander.T @ vander)
+        normal_inv.flags.writeable = False
+    except np.linalg.LinAlgError:
+        normal_inv = None
+    vander.flags.writeable = False
+    pinv.flags.writeable = False
+    return vander, pinv, normal_inv, rank
+
+
+def fit_parabola(x_data, y_data, cov=False):
+    """
+    Аппроксимирует данные параболой y = ax² + bx + c методом наименьших квадратов.
+    Модель линейна по параметрам, поэтому решение находится напрямую
+    (псевдообратная матрица Вандермонда, см. _parabola_pinv), без итераций
+    нелинейного оптимизатора.
+    
+    Args:
+        x_data (array): Данные по оси X
+        y_data (array): Данные по оси Y; двумерный массив N×K задаёт K наборов данных
+            на одной сетке x, которые аппроксимируются одним матричным умножением
+        cov (bool): Возвращать ли также ковариационную матрицу параметров
+            (как в np.polyfit: s² (VᵀV)⁻¹, где s² — остаточная дисперсия)
+        
+    Returns:
+        array: Коэффициенты (a, b, c) (для двумерного y_data — массив 3×K) или None,
+            если задача не решается (меньше трёх различных значений x).
+            При cov=True — кортеж (коэффициенты, ковариационная матрица);
+            для двумерного y_data ковариационные матрицы имеют форму K×3×3. Матрица равна None,
+            если точек не больше трёх и остаточную дисперсию оценить нельзя
+    """
+    try:
+        x_array = np.asarray(x_data, dtype=np.float64)
+        if not np.all(np.isfinite(x_array)):
+            raise ValueError("данные по оси X содержат NaN или inf")
+        x_tuple = tuple(x_array.tolist())
+        vander, pinv, normal_inv, rank = _parabola_pinv(x_tuple)
+        if rank < 3:
+            # Псевдообратная матрица дала бы решение с минимальной нормой и R² = 1,
+            # хотя парабола по таким точкам не определена
+            raise ValueError(f"для параболы нужно не меньше трёх различных значений x "
+                             f"(точек: {len(x_tuple)}, различных: {len(set(x_tuple))})")
+        y_array = np.asarray(y_data, dtype=np.float64)
+        if not np.all(np.isfinite(y_array)):
+            # Иначе умножение на псевдообратную матрицу молча дало бы NaN-коэффициенты
+            raise ValueError("данные по оси Y содержат NaN или inf")
+        coefficients = pinv @ y_array
+    except (np.linalg.LinAlgError, ValueError) as e:
+        print(f"Ошибка при подгонке функции: {e}")
+        return (None, None) if cov else None
+    if not cov:
+        return coefficients
+    n_points = len(y_array)
+    if n_points <= 3:
+        return coefficients, None
+    residuals = y_array - vander @ coefficients
+    residual_variance = (residuals * residuals).sum(axis=0) / (n_points - 3)
+    if normal_inv is None:
+        return coefficients, None
+    return coefficients, np.multiply.outer(residual_variance, normal_inv)
+
+
+def fit_parabolas_batched(w_values, std_values_list, fit_sample_points=None):
+    """
+    Аппроксимирует параболами несколько зависимостей std(w) на общей сетке w
+    (например, для осей x и y) одним решением МНК
+    
+    Args:
+        w_values (list): Значения параметра w
+        std_values_list (list): Списки значений стандартного отклонения для каждого набора
+        fit_sample_points (int, optional): Прореживание точек, как в fit_parabola_and_calculate_emittance
+        
+    Returns:
+        list: Пары (коэффициенты (a, b, c), ковариационная матрица или None) для каждого набора;
+            (None, None), если аппроксимация не удалась
+    """
+    w_array = np.asarray(w_values, dtype=np.float64)
+    std_matrix = np.column_stack([np.asarray(std, dtype=np.float64) for std in std_values_list])
+    if fit_sample_points is not None and len(w_array) > DOWNSAMPLE_MIN_POINTS:
+        idx = downsample_indices(len(w_array), fit_sample_points)
+        w_array, std_matrix = w_array[idx], std_matrix[idx]
+    if not np.all(np.isfinite(std_matrix)):
+        # Некорректные данные одного набора не должны мешать аппроксимации остальных
+        return [fit_parabola(w_array, std_matrix[:, k], cov=True) for k in range(std_matrix.shape[1])]
+    coefficients, covariances = fit_parabola(w_array, std_matrix, cov=True)
+    if coefficients is None:
+        return [(None, None)] * std_matrix.shape[1]
+    return [(coefficients[:, k], None if covariances is None else covariances[k])
+            for k in range(std_matrix.shape[1])]
+
+
 def calculate_r_squared(y_actual, y_predicted):
     """
     Вычисляет коэффициент детерминации R²
@@ -61,13 +179,33 @@ def calculate_r_squared(y_actual, y_predicted):
     Returns:
         float: Коэффициент детерминации R²
     """
-    ss_res = np.sum((y_actual - y_predicted) ** 2)
-    ss_tot = np.sum((y_actual - np.mean(y_actual)) ** 2)
+    y_actual = np.asarray(y_actual, dtype=np.float64)
+    # Суммы квадратов через скалярное произведение: без временного массива квадратов
+    residuals = y_actual - y_predicted
+    ss_res = residuals @ residuals
+    deviations = y_actual - y_actual.mean()
+    ss_tot = deviations @ deviations
     r_squared = 1 - (ss_res / ss_tot)
     return r_squared
 
 
-def fit_parabola_and_calculate_emittance(w_values, std_values, d, gamma, beta, axis_name="x", verbose=False):
+def downsample_indices(n_points, n_samples):
+    """
+    Выбирает индексы точек, логарифмически распределённых по диапазону [0, n_points - 1].
+    Первая и последняя точки включаются всегда.
+    
+    Args:
+        n_points (int): Общее количество точек
+        n_samples (int): Желаемое количество точек
+        
+    Returns:
+        array: Отсортированные уникальные индексы
+    """
+    return np.unique(np.geomspace(1, n_points, n_samples).round().astype(int) - 1)
+
+
+def fit_parabola_and_calculate_emittance(w_values, std_values, d, gamma, beta, axis_name="x", verbose=False,
+                                         fit_sample_points=None, fit_result=None):
     """
     Аппроксимирует зависимость стандартного отклонения от w параболой
     и вычисляет параметры эмиттанса
@@ -80,6 +218,11 @@ def fit_parabola_and_calculate_emittance(w_values, std_values, d, gamma, beta, a
         beta (float): Относительная скорость
         axis_name (str): Название оси (x или y)
         verbose (bool): Флаг подробного вывода
+        fit_sample_points (int, optional): Если задано и точек больше DOWNSAMPLE_MIN_POINTS,
+            парабола подгоняется только по fit_sample_points логарифмически распределённым точкам
+            (R² и предсказанные значения по-прежнему считаются по всем точкам)
+        fit_result (tuple, optional): Уже найденные (коэффициенты, ковариационная матрица),
+            например из fit_parabolas_batched; тогда повторная подгонка не выполняется
     Returns:
         dict: Параметры эмиттанса
     """
@@ -93,8 +236,13 @@ def fit_parabola_and_calculate_emittance(w_values, std_values, d, gamma, beta, a
     
     # Подгонка параболы: std² = a * w² + b * w + c
     # Но мы аппроксимируем std = sqrt(a * w² + b * w + c)
-    # Для этого используем квадратичную функцию
-    popt, pcov = fit_function(w_array, std_array, quadratic_function)
+    # Для этого используем квадратичную функцию (линейный МНК)
+    if verbose and fit_sample_points is not None and len(w_array) > DOWNSAMPLE_MIN_POINTS:
+        n_used = len(downsample_indices(len(w_array), fit_sample_points))
+        print(f"Аппроксимация по {n_used} из {len(w_array)} точек")
+    if fit_result is None:
+        fit_result = fit_parabolas_batched(w_array, [std_array], fit_sample_points)[0]
+    popt, pcov = fit_result
     
     if popt is None:
         print(f"Ошибка при аппроксимации для оси {axis_name}")
@@ -111,6 +259,9 @@ def fit_parabola_and_calculate_emittance(w_values, std_values, d, gamma, beta, a
     if verbose:
         print(f"Параболическая аппроксимация: std = {a:.6f} * w² + {b:.6f} * w + {c:.6f}")
         print(f"R² = {r_squared:.6f}")
+        if pcov is not None:
+            a_err, b_err, c_err = np.sqrt(np.diag(pcov))
+            print(f"Погрешности параметров: Δa = {a_err:.6e}, Δb = {b_err:.6e}, Δc = {c_err:.6e}")
     
     # Вычисляем параметры эмиттанса
     # sigma2_x0 = a (коэффициент при w²)
@@ -138,8 +289,9 @@ def fit_parabola_and_calculate_emittance(w_values, std_values, d, gamma, beta, a
         print(f"{param_names[0]} = {sigma2_0:.6e}")
         print(f"{param_names[1]} = {sigma2_1:.6e}")
         print(f"{param_names[2]} = {sigma2_2:.6e}")
-    print(f"{param_names[3]} = {emittance:.6e} м·рад")
-    print(f"{param_names[4]} = {norm_emittance:.6e} м·рад")
+        # Без verbose эмиттанс выводится только в итоговой сводке main.py
+        print(f"{param_names[3]} = {emittance:.6e} м·рад")
+        print(f"{param_names[4]} = {norm_emittance:.6e} м·рад")
     
     return {
         'sigma2_0': sigma2_0,
@@ -149,6 +301,7 @@ def fit_parabola_and_calculate_emittance(w_values, std_values, d, gamma, beta, a
         'norm_emittance': norm_emittance,
         'r_squared': r_squared,
         'parameters': popt,
+        'covariance': pcov,
         'predicted_values': std_predicted,
         'param_names': param_names
     }
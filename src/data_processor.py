@@ -5,7 +5,19 @@
 
 import pandas as pd
 import numpy as np
+import math
 import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from src.results_cache import results_cache_key, load_results, save_results, load_frame, save_frame
+
+
+# Прочитанные в этом процессе файлы (LRU): при повторных вызовах, например из ноутбука,
+# неизменённые файлы не перечитываются и пул процессов для них не запускается
+_PARSED_FILES_MAX_ENTRIES = 64
+_parsed_files = OrderedDict()
 
 
 def weighted_std(values, weights):
@@ -14,103 +26,288 @@ def weighted_std(values, weights):
     
     Args:
         values (array): Значения для которых вычисляется стандартное отклонение
-        weights (array): Веса для каждого значения
+        weights (array): Веса для каждого значения (допускаются float32 массивы,
+            суммы всегда накапливаются в float64)
         
     Returns:
         float: Взвешенное стандартное отклонение
     """
-    if len(values) == 0 or sum(weights) == 0:
+    # Приводим к непрерывным float64 массивам, чтобы np.dot ушёл в BLAS
+    weights = np.ascontiguousarray(weights, dtype=np.float64)
+    # Сумма весов считается один раз (NumPy, а не встроенной sum по элементам)
+    # и используется и для проверки, и для нормировки моментов
+    sw = weights.sum()
+    if len(values) == 0 or sw == 0:
         return 0
     
-    # Взвешенное среднее
-    weighted_mean = np.average(values, weights=weights)
+    # Значения сдвигаются на первый элемент: дисперсия от сдвига не зависит, а моменты
+    # считаются от величин порядка разброса, и в m2 - m1² нет катастрофического
+    # сокращения, когда среднее много больше стандартного отклонения
+    values = np.asarray(values, dtype=np.float64)
+    values = values - values[0]
     
-    # Взвешенная дисперсия
-    weighted_variance = np.average((values - weighted_mean)**2, weights=weights)
+    # Взвешенные первый и второй моменты; einsum считает сумму w*v*v
+    # одним циклом, без временного массива values * values
+    m1 = np.dot(weights, values) / sw
+    m2 = np.einsum('i,i,i->', weights, values, values) / sw
     
-    # Взвешенное стандартное отклонение
-    weighted_std = np.sqrt(weighted_variance)
+    # Взвешенное стандартное отклонение (max защищает от отрицательной
+    # дисперсии из-за ошибок округления при почти постоянных данных)
+    return math.sqrt(max(m2 - m1 * m1, 0.0))
+
+
+def grouped_weighted_std(values_list, weights_list, return_mean=False):
+    """
+    Вычисляет взвешенные стандартные отклонения сразу для нескольких наборов данных.
+    Наборы склеиваются в один массив с номером набора для каждого элемента, и все
+    суммы считаются сгруппированными редукциями np.bincount, без цикла по наборам.
     
-    return weighted_std
+    Args:
+        values_list (list): Массивы значений для каждого набора
+        weights_list (list): Массивы весов для каждого набора
+        return_mean (bool): Возвращать ли также взвешенные средние наборов (по умолчанию False)
+        
+    Returns:
+        array: Взвешенные стандартные отклонения (0 для пустых наборов и наборов с нулевой суммой весов);
+            при return_mean=True — кортеж (стандартные отклонения, средние)
+    """
+    n_groups = len(values_list)
+    if n_groups == 0:
+        return (np.empty(0), np.empty(0)) if return_mean else np.empty(0)
+    lengths = [len(values) for values in values_list]
+    group_ids = np.repeat(np.arange(n_groups), lengths)
+    values = np.concatenate(values_list).astype(np.float64, copy=False)
+    weights = np.concatenate(weights_list).astype(np.float64, copy=False)
+    sw = np.bincount(group_ids, weights=weights, minlength=n_groups)
+    # Для пустых наборов делим на 1, результат для них затем заменяется нулём
+    safe_sw = np.where(sw == 0, 1.0, sw)
+    mean = np.bincount(group_ids, weights=weights * values, minlength=n_groups) / safe_sw
+    deviations = values - mean[group_ids]
+    variance = np.bincount(group_ids, weights=weights * deviations * deviations, minlength=n_groups) / safe_sw
+    std = np.where(sw == 0, 0.0, np.sqrt(variance))
+    if return_mean:
+        return std, mean
+    return std
+
+
+def _read_excel_openpyxl(file_path, max_cols=3):
+    """
+    Потоково читает первые max_cols столбцов первого листа Excel-файла через openpyxl
+    в режиме read_only (без построения объектов всех ячеек листа).
+    Возвращает DataFrame из float64 без заголовков.
+    openpyxl нужен только как запасной вариант, поэтому импортируется здесь,
+    а не при импорте модуля (в том числе в каждом рабочем процессе).
+    """
+    from openpyxl import load_workbook
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        n_cols = min(max_cols, sheet.max_column or max_cols)
+        rows = list(sheet.iter_rows(min_col=1, max_col=n_cols, values_only=True))
+    finally:
+        workbook.close()
+    data = np.array(rows, dtype=np.float64).reshape(-1, n_cols)
+    # Как и pd.read_excel, отбрасываем пустые строки и столбцы в конце листа
+    empty = np.isnan(data)
+    filled_rows = np.flatnonzero(~empty.all(axis=1))
+    filled_cols = np.flatnonzero(~empty.all(axis=0))
+    n_rows = filled_rows[-1] + 1 if filled_rows.size else 0
+    n_cols = filled_cols[-1] + 1 if filled_cols.size else 0
+    return pd.DataFrame(data[:n_rows, :n_cols])
+
+
+def _read_excel(file_path, cache_dir=None, max_cols=3, engine='calamine', cache_max_entries=100):
+    """
+    Читает первые max_cols столбцов первого листа Excel-файла без заголовков
+    в DataFrame из float64. Остальные столбцы не разбираются, а тип задаётся
+    заранее, без определения типов по содержимому ячеек. Трёх столбцов достаточно
+    для обоих форматов: для modelling третий столбец нужен только для проверки
+    структуры файла (check_excel_structure).
+    По умолчанию используется движок calamine (python-calamine, парсер на Rust),
+    который в разы быстрее openpyxl; если он недоступен или задан engine='openpyxl',
+    файл потоково читается через openpyxl.
+    Если задана папка cache_dir, прочитанный лист сохраняется в кэш, и пока файл
+    не изменился, при следующих запусках берётся оттуда без разбора Excel.
+    """
+    if cache_dir is not None:
+        data = load_frame(cache_dir, file_path)
+        if data is not None:
+            return pd.DataFrame(data)
+    if engine == 'openpyxl':
+        df = _read_excel_openpyxl(file_path, max_cols)
+    else:
+        try:
+            # usecols задаётся функцией, а не списком индексов: в файлах с меньшим
+            # числом столбцов список приводит к ошибке о несуществующих столбцах
+            # Книга открывается через ExcelFile: при чтении нескольких листов
+            # архив и таблица общих строк разбираются один раз
+            with pd.ExcelFile(file_path, engine=engine) as workbook:
+                df = workbook.parse(0, header=None, dtype=np.float64,
+                                    usecols=lambda col: col < max_cols)
+        except ImportError:
+            # Движок не установлен (python-calamine отсутствует). Ошибки разбора и неизвестное
+            # имя движка не перехватываются: иначе файл молча читался бы повторно через openpyxl
+            df = _read_excel_openpyxl(file_path, max_cols)
+    if cache_dir is not None:
+        save_frame(cache_dir, file_path, df.to_numpy(dtype=np.float64), cache_max_entries)
+    return df
 
 
-def read_excel_data(file_path):
+def read_excel_data(file_path, cache_dir=None, engine='calamine', cache_max_entries=100):
     """
     Читает данные из Excel файла и подготавливает их для анализа
     Args:
         file_path (str): Путь к Excel файлу
+        cache_dir (str or Path, optional): Папка кэша прочитанных листов (см. _read_excel)
+        engine (str): Движок чтения Excel (см. _read_excel, по умолчанию 'calamine')
+        cache_max_entries (int): Максимальное количество листов в кэше (по умолчанию 100)
     Returns:
         tuple: (df, distances_col2, weights_col2, distances_col3, weights_col3)
     """
     # Чтение данных из Excel файла без использования первой строки как заголовков
-    df = pd.read_excel(file_path, header=None)
-    # Перевод расстояний из миллиметров в метры (первая колонка)
-    df.iloc[:, 0] = df.iloc[:, 0] * 0.001
-    # Подготовка данных для взвешенного стандартного отклонения
+    df = _read_excel(file_path, cache_dir, engine=engine, cache_max_entries=cache_max_entries)
+    # Лист один раз переводится в непрерывный массив; перевод расстояний из миллиметров
+    # в метры (первая колонка) выполняется на месте в NumPy, без присваивания через iloc
+    data = df.to_numpy(dtype=np.float64, na_value=np.nan, copy=True)
+    data[:, 0] *= 0.001
+    df = pd.DataFrame(data, copy=False)
+    # Подготовка данных для взвешенного стандартного отклонения:
+    # маски строятся прямо на этом массиве, без промежуточных pandas Series.
+    # Отобранные значения хранятся в float32 (точности измерений достаточно, а объём вдвое
+    # меньше, в том числе при передаче из рабочих процессов); в float32 переводятся только
+    # отобранные элементы, без копии всего листа. Суммы считаются в float64
+    col0, col1, col2 = data[:, 0], data[:, 1], data[:, 2]
+    # Маска заполненных расстояний общая для обеих колонок и строится один раз
+    valid_distances = ~np.isnan(col0)
     # Для второй колонки
-    valid_col2_mask = df.iloc[:, 1].notna() & (df.iloc[:, 1] != 0) & df.iloc[:, 0].notna()
-    distances_col2 = df.loc[valid_col2_mask, 0].values  # Расстояния (в метрах)
-    weights_col2 = df.loc[valid_col2_mask, 1].values   # Количество измерений
+    valid_col2_mask = valid_distances & (col1 != 0.0) & ~np.isnan(col1)
+    distances_col2 = col0[valid_col2_mask].astype(np.float32)  # Расстояния (в метрах)
+    weights_col2 = col1[valid_col2_mask].astype(np.float32)   # Количество измерений
     # Для третьей колонки
-    valid_col3_mask = df.iloc[:, 2].notna() & (df.iloc[:, 2] != 0) & df.iloc[:, 0].notna()
-    distances_col3 = df.loc[valid_col3_mask, 0].values  # Расстояния (в метрах)
-    weights_col3 = df.loc[valid_col3_mask, 2].values   # Количество измерений
+    valid_col3_mask = valid_distances & (col2 != 0.0) & ~np.isnan(col2)
+    distances_col3 = col0[valid_col3_mask].astype(np.float32)  # Расстояния (в метрах)
+    weights_col3 = col2[valid_col3_mask].astype(np.float32)   # Количество измерений
     return df, distances_col2, weights_col2, distances_col3, weights_col3
 
 
-def process_data_files(data_files, field_values, data_folder='data', verbose=False):
+def _read_files_parallel(reader, file_paths, *args):
     """
-    Обрабатывает список файлов и вычисляет взвешенные стандартные отклонения
+    Читает файлы функцией reader(file_path, *args) параллельно в пуле процессов.
+    Результаты запоминаются по (reader, путь, время изменения, размер, args), поэтому
+    файлы, прочитанные ранее и с тех пор не изменённые, берутся из памяти.
+    Returns:
+        dict: Результаты reader для каждого пути в порядке file_paths
+    """
+    keys = {}
+    for file_path in file_paths:
+        stat = os.stat(file_path)
+        keys[file_path] = (reader.__name__, os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size, args)
+    pending = [file_path for file_path in file_paths if keys[file_path] not in _parsed_files]
+    max_workers = min(len(pending), os.cpu_count() or 1)
+    if max_workers == 1:
+        # Один файл (или одно ядро): запуск пула стоит дороже, чем даёт параллельность
+        for file_path in pending:
+            _parsed_files[keys[file_path]] = reader(file_path, *args)
+    elif pending:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            for file_path, result in zip(pending, executor.map(reader, pending, *(repeat(arg) for arg in args))):
+                _parsed_files[keys[file_path]] = result
+    results = {}
+    for file_path in file_paths:
+        _parsed_files.move_to_end(keys[file_path])
+        results[file_path] = _parsed_files[keys[file_path]]
+    while len(_parsed_files) > _PARSED_FILES_MAX_ENTRIES:
+        _parsed_files.popitem(last=False)
+    return results
+
+
+def process_data_files(data_files, field_values, data_folder='data', verbose=False,
+                       cache_dir=None, cache_max_entries=100, engine='calamine'):
+    """
+    Обрабатывает список файлов и вычисляет взвешенные стандартные отклонения.
+    Файлы независимы друг от друга, поэтому читаются параллельно в пуле процессов
+    (файлы, уже прочитанные в этом процессе и не изменённые, повторно не читаются);
+    стандартные отклонения затем вычисляются для всех файлов одним векторным проходом
+    (grouped_weighted_std). Порядок результатов совпадает с порядком data_files.
     Args:
         data_files (list): Список имен файлов для обработки
         field_values (list): Список значений field, соответствующих каждому файлу
         data_folder (str): Папка с данными (по умолчанию 'data')
         verbose (bool): Флаг для вывода отладочной информации (по умолчанию False)
+        cache_dir (str or Path, optional): Папка для кэша результатов и прочитанных листов; если задана
+            и входные файлы не менялись, результаты берутся из кэша без чтения Excel
+        cache_max_entries (int): Максимальное количество записей в кэше результатов и в кэше
+            прочитанных листов (по умолчанию 100)
+        engine (str): Движок чтения Excel (см. _read_excel, по умолчанию 'calamine')
     Returns:
-        tuple: (weighted_std_col2, weighted_std_col3, field_values)
+        tuple: (weighted_std_col2, weighted_std_col3, field_values, row_counts),
+            где weighted_std_col2 и weighted_std_col3 — массивы длины len(data_files)
+            (NaN для ненайденных файлов), row_counts — список пар (строк во 2-й колонке,
+            строк в 3-й колонке) для каждого файла или None, если файл не найден
     """
-    weighted_std_distances_col2 = []
-    weighted_std_distances_col3 = []
+    file_paths = [os.path.join(data_folder, filename) for filename in data_files]
+    if cache_dir is not None:
+        cache_key = results_cache_key('experiment', file_paths, field_values)
+        # При verbose кэш результатов не читается: диагностика по файлам выводится при каждом запуске
+        cached = None if verbose else load_results(cache_dir, cache_key)
+        if cached is not None:
+            weighted_std_distances_col2, weighted_std_distances_col3, row_counts = cached
+            return weighted_std_distances_col2, weighted_std_distances_col3, field_values, row_counts
+    # Результаты записываются по индексу файла в заранее выделенные массивы
+    weighted_std_distances_col2 = np.full(len(data_files), np.nan)
+    weighted_std_distances_col3 = np.full(len(data_files), np.nan)
+    row_counts = []
+    existing_paths = [file_path for file_path in file_paths if os.path.isfile(file_path)]
+    results = _read_files_parallel(read_excel_data, existing_paths, cache_dir, engine, cache_max_entries)
+    processed_paths = list(results)
+    # Средние второй колонки вычисляются попутно и используются в подробном выводе
+    std_col2, mean_col2 = grouped_weighted_std([results[path][1] for path in processed_paths],
+                                               [results[path][2] for path in processed_paths],
+                                               return_mean=True)
+    std_col3 = grouped_weighted_std([results[path][3] for path in processed_paths],
+                                    [results[path][4] for path in processed_paths])
+    std_by_path = {path: (std_col2[j], std_col3[j], mean_col2[j]) for j, path in enumerate(processed_paths)}
     if verbose:
         print("Обработка файлов из папки data:")
         print("-" * 40)
-    for i, filename in enumerate(data_files):
-        file_path = os.path.join(data_folder, filename)
-        if os.path.exists(file_path):
+    for i, (filename, file_path) in enumerate(zip(data_files, file_paths)):
+        if file_path in results:
+            df, distances_col2, weights_col2, distances_col3, weights_col3 = results[file_path]
+            weighted_std_col2, weighted_std_col3, weighted_mean_col2 = std_by_path[file_path]
+            weighted_std_distances_col2[i] = weighted_std_col2
+            weighted_std_distances_col3[i] = weighted_std_col3
+            row_counts.append((len(distances_col2), len(distances_col3)))
+            # Вывод информации о данных
             if verbose:
                 print(f"\nОбработка файла: {filename}")
                 print(f"Соответствующее значение field: {field_values[i]}")
-            # Чтение и обработка данных
-            df, distances_col2, weights_col2, distances_col3, weights_col3 = read_excel_data(file_path)
-            # Вывод информации о данных
-            if verbose:
                 print(f"Размер данных: {df.shape}")
                 print("Первые 5 строк данных:")
                 print(df.head())
-            if verbose:
                 print(f"Количество строк с данными во второй колонке: {len(distances_col2)}")
                 print(f"Количество строк с данными в третьей колонке: {len(distances_col3)}")
-            # Вычисляем взвешенные стандартные отклонения расстояний
-            weighted_std_col2 = weighted_std(distances_col2, weights_col2)
-            weighted_std_col3 = weighted_std(distances_col3, weights_col3)
-            weighted_std_distances_col2.append(weighted_std_col2)
-            weighted_std_distances_col3.append(weighted_std_col3)
-            if verbose and len(distances_col2) > 0:
-                print(f"Пример для второй колонки:")
-                print(f"  Расстояния (м): {distances_col2[:5]}...")
-                print(f"  Веса (количество измерений): {weights_col2[:5]}...")
-                print(f"  Взвешенное среднее (м): {np.average(distances_col2, weights=weights_col2):.6f}")
+                if len(distances_col2) > 0:
+                    print(f"Пример для второй колонки:")
+                    print(f"  Расстояния (м): {distances_col2[:5]}...")
+                    print(f"  Веса (количество измерений): {weights_col2[:5]}...")
+                    print(f"  Взвешенное среднее (м): {weighted_mean_col2:.6f}")
         else:
+            row_counts.append(None)
             if verbose:
                 print(f"Файл {filename} не найден!")
-    return weighted_std_distances_col2, weighted_std_distances_col3, field_values
+    if cache_dir is not None:
+        save_results(cache_dir, cache_key, weighted_std_distances_col2, weighted_std_distances_col3,
+                     row_counts, cache_max_entries)
+    return weighted_std_distances_col2, weighted_std_distances_col3, field_values, row_counts
 
 
-def check_excel_structure(file_path, expected_cols, data_type):
+def check_excel_structure(file_path, expected_cols, data_type, df=None):
     """
     Проверяет структуру Excel-файла. Если количество столбцов не совпадает с ожидаемым для выбранного типа обработки, вызывает ошибку.
+    Если передан уже прочитанный DataFrame df, файл повторно не читается.
     """
-    df = pd.read_excel(file_path, header=None)
+    if df is None:
+        df = _read_excel(file_path)
     if df.shape[1] != expected_cols:
         if data_type == 'modelling' and df.shape[1] != 2:
             raise ValueError(f"Ошибка: выбран тип обработки 'modelling', но в файле {file_path} не 2 столбца!")
@@ -119,38 +316,80 @@ def check_excel_structure(file_path, expected_cols, data_type):
     return df
 
 
-def read_excel_data_modelling(file_path):
+def read_excel_data_modelling(file_path, df=None):
     """
     Читает данные формата modelling: 2 столбца (x, y), веса = 1
-    Возвращает массивы x, y, веса (все веса = 1)
+    Возвращает массивы x, y, веса (все веса = 1).
+    Если передан уже прочитанный DataFrame df, файл повторно не читается.
     """
-    df = pd.read_excel(file_path, header=None)
+    if df is None:
+        df = _read_excel(file_path)
     if df.shape[1] != 2:
         raise ValueError(f"Файл {file_path} не соответствует формату modelling (2 столбца)")
-    x = df.iloc[:, 0].values * 0.001  # Переводим из мм в метры
-    y = df.iloc[:, 1].values * 0.001
+    # Оба столбца переводятся из мм в метры одной операцией над NumPy массивом
+    xy = (df.to_numpy(dtype=np.float64, na_value=np.nan) * 0.001).astype(np.float32)
+    x, y = xy[:, 0], xy[:, 1]
     weights = np.ones_like(x)
     return x, y, weights
 
 
-def process_data_files_modelling(data_files, field_values, data_folder='data', verbose=False, data_type='modelling'):
+def _read_modelling_file(file_path, data_type='modelling', cache_dir=None, engine='calamine',
+                         cache_max_entries=100):
+    """
+    Проверяет структуру и читает один файл формата modelling.
+    Выполняется в рабочих процессах process_data_files_modelling.
+    Returns:
+        tuple: (x, y, weights)
+    """
+    # Файл читается один раз: тот же DataFrame используется для проверки и извлечения данных
+    df = _read_excel(file_path, cache_dir, engine=engine, cache_max_entries=cache_max_entries)
+    check_excel_structure(file_path, 2, data_type, df=df)
+    return read_excel_data_modelling(file_path, df=df)
+
+
+def process_data_files_modelling(data_files, field_values, data_folder='data', verbose=False, data_type='modelling',
+                                 cache_dir=None, cache_max_entries=100, engine='calamine'):
     """
     Обрабатывает список файлов формата modelling (2 столбца, веса = 1)
-    Возвращает стандартные отклонения по x и y для каждого файла
-    """
-    std_x = []
-    std_y = []
-    for i, filename in enumerate(data_files):
-        file_path = os.path.join(data_folder, filename)
-        if os.path.exists(file_path):
-            # Проверка структуры файла
-            df = check_excel_structure(file_path, 2, data_type)
-            x, y, weights = read_excel_data_modelling(file_path)
-            std_x.append(np.std(x))
-            std_y.append(np.std(y))
+    Возвращает стандартные отклонения по x и y для каждого файла, field_values
+    и количество непустых строк (x, y) для каждого файла (None, если файл не найден).
+    Стандартные отклонения возвращаются массивами длины len(data_files), NaN — для ненайденных файлов.
+    Как и в process_data_files, файлы читаются параллельно в пуле процессов,
+    а стандартные отклонения всех файлов вычисляются одним векторным проходом.
+    Параметры cache_dir, cache_max_entries и engine — как в process_data_files
+    """
+    file_paths = [os.path.join(data_folder, filename) for filename in data_files]
+    if cache_dir is not None:
+        cache_key = results_cache_key(data_type, file_paths, field_values)
+        # При verbose кэш результатов не читается: диагностика по файлам выводится при каждом запуске
+        cached = None if verbose else load_results(cache_dir, cache_key)
+        if cached is not None:
+            std_x, std_y, row_counts = cached
+            return std_x, std_y, field_values, row_counts
+    existing_paths = [file_path for file_path in file_paths if os.path.isfile(file_path)]
+    results = _read_files_parallel(_read_modelling_file, existing_paths, data_type, cache_dir, engine,
+                                   cache_max_entries)
+    processed_paths = list(results)
+    # Все веса равны 1, поэтому взвешенное стандартное отклонение совпадает с np.std
+    all_std_x = grouped_weighted_std([results[path][0] for path in processed_paths],
+                                     [results[path][2] for path in processed_paths])
+    all_std_y = grouped_weighted_std([results[path][1] for path in processed_paths],
+                                     [results[path][2] for path in processed_paths])
+    std_by_path = {path: (all_std_x[j], all_std_y[j]) for j, path in enumerate(processed_paths)}
+    std_x = np.full(len(data_files), np.nan)
+    std_y = np.full(len(data_files), np.nan)
+    row_counts = []
+    for i, (filename, file_path) in enumerate(zip(data_files, file_paths)):
+        if file_path in results:
+            x, y, weights = results[file_path]
+            std_x[i], std_y[i] = std_by_path[file_path]
+            row_counts.append((np.count_nonzero(~np.isnan(x)), np.count_nonzero(~np.isnan(y))))
             if verbose:
-                print(f"Файл {filename}: std_x = {std_x[-1]:.6e}, std_y = {std_y[-1]:.6e}")
+                print(f"Файл {filename}: std_x = {std_x[i]:.6e}, std_y = {std_y[i]:.6e}")
         else:
+            row_counts.append(None)
             if verbose:
                 print(f"Файл {filename} не найден!")
-    return std_x, std_y, field_values 
\ No newline at end of file
+    if cache_dir is not None:
+        save_results(cache_dir, cache_key, std_x, std_y, row_counts, cache_max_entries)
+    return std_x, std_y, field_values, row_counts
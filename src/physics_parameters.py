@@ -3,6 +3,9 @@
 Содержит константы и функции для расчета вспомогательных величин.
 """
 
+import math
+from functools import lru_cache
+
 import numpy as np
 
 
@@ -23,9 +26,12 @@ class PhysicsConstants:
     m_c2 = m * c**2
 
 
+@lru_cache(maxsize=32)
 def calculate_relativistic_parameters(epsilon):
     """
-    Вычисляет релятивистские параметры gamma и beta
+    Вычисляет релятивистские параметры gamma и beta.
+    Результат зависит только от энергии и кэшируется: функция вызывается
+    и из main.py, и из calculate_w_parameter с тем же epsilon
     
     Args:
         epsilon (float): Энергия электрона (Дж)
@@ -34,7 +40,7 @@ def calculate_relativistic_parameters(epsilon):
         tuple: (gamma, beta)
     """
     gamma = epsilon / PhysicsConstants.m_c2
-    beta = np.sqrt(1 - 1 / gamma**2)
+    beta = math.sqrt(1 - 1 / (gamma * gamma))
     return gamma, beta
 
 
@@ -50,17 +56,16 @@ def calculate_w_parameter(field_values, d, l, Z, epsilon):
         epsilon (float): Энергия электрона (Дж)
         
     Returns:
-        list: Значения параметра w
+        array: Значения параметра w
     """
     gamma, beta = calculate_relativistic_parameters(epsilon)
     
-    w_values = []
-    for B in field_values:
-        # w = 1 - d * l * (e * Z * B)**2 / (2 * m * c * gamma * beta)**2
-        numerator = d * l * (PhysicsConstants.e * Z * B)**2
-        denominator = (2 * PhysicsConstants.m * PhysicsConstants.c * gamma * beta)**2
-        w = 1 - numerator / denominator
-        w_values.append(w)
+    # w = 1 - d * l * (e * Z * B)**2 / (2 * m * c * gamma * beta)**2,
+    # вычисляется сразу для всех значений поля
+    B = np.asarray(field_values, dtype=np.float64)
+    numerator = d * l * (PhysicsConstants.e * Z * B)**2
+    denominator = (2 * PhysicsConstants.m * PhysicsConstants.c * gamma * beta)**2
+    w_values = 1 - numerator / denominator
     
     return w_values
 
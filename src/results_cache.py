@@ -0,0 +1,174 @@
+"""
+Модуль для кэширования результатов обработки файлов данных на диске.
+Результаты сохраняются в .npz файлы, имя которых — хэш от путей, размеров
+и времени изменения входных файлов, поэтому при изменении данных кэш
+автоматически становится неактуальным. Аналогично в подпапке frames
+кэшируются прочитанные листы отдельных Excel-файлов (.npy).
+"""
+
+import hashlib
+import os
+import zipfile
+from pathlib import Path
+
+import numpy as np
+
+
+# Версия формата и алгоритма обработки: входит в ключ кэша, поэтому при её увеличении
+# записи, созданные прежней версией кода, перестают использоваться.
+# Увеличивать при любом изменении, влияющем на сохраняемые результаты
+CACHE_VERSION = 2
+
+
+def _file_signature(file_path):
+    """Возвращает байтовую подпись файла: путь, размер и время изменения"""
+    stat = os.stat(file_path)
+    return os.fsencode(file_path) + f"|{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8")
+
+
+def _evict_old_entries(cache_dir, pattern, max_entries):
+    """Удаляет самые давно использованные записи, если их больше max_entries"""
+    entries = sorted(Path(cache_dir).glob(pattern), key=lambda p: p.stat().st_mtime)
+    for entry in entries[:max(len(entries) - max_entries, 0)]:
+        entry.unlink()
+
+
+def results_cache_key(data_type, file_paths, field_values):
+    """
+    Вычисляет ключ кэша для набора входных файлов
+
+    Args:
+        data_type (str): Тип данных ("experiment" или "modelling")
+        file_paths (list): Пути к файлам данных
+        field_values (list): Значения field, соответствующие файлам
+
+    Returns:
+        str: Шестнадцатеричный хэш (blake2b)
+    """
+    key = hashlib.blake2b(digest_size=16)
+    key.update(f"v{CACHE_VERSION}".encode("utf-8"))
+    key.update(data_type.encode("utf-8"))
+    key.update(repr([float(field) for field in field_values]).encode("utf-8"))
+    for file_path in file_paths:
+        key.update(os.fsencode(file_path))
+        try:
+            stat = os.stat(file_path)
+            key.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+        except OSError:
+            key.update(b"missing")
+    return key.hexdigest()
+
+
+def load_results(cache_dir, key):
+    """
+    Загружает результаты обработки из кэша
+
+    Args:
+        cache_dir (str or Path): Папка кэша
+        key (str): Ключ кэша
+
+    Returns:
+        tuple or None: (std_col2, std_col3, row_counts) или None, если записи нет
+    """
+    cache_path = Path(cache_dir) / f"{key}.npz"
+    if not cache_path.exists():
+        return None
+    try:
+        with np.load(cache_path) as data:
+            std_col2 = data["std_col2"]
+            std_col3 = data["std_col3"]
+            counts = data["row_counts"]
+    except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+        # Повреждённая запись: считаем, что её нет, она будет перезаписана
+        return None
+    # Обновляем время изменения, чтобы вытеснение удаляло давно не использованные записи
+    os.utime(cache_path)
+    row_counts = [None if n2 < 0 else (int(n2), int(n3)) for n2, n3 in counts]
+    return std_col2, std_col3, row_counts
+
+
+def save_results(cache_dir, key, std_col2, std_col3, row_counts, max_entries=100):
+    """
+    Сохраняет результаты обработки в кэш и удаляет самые старые записи,
+    если их больше max_entries
+
+    Args:
+        cache_dir (str or Path): Папка кэша (создаётся при необходимости)
+        key (str): Ключ кэша
+        std_col2 (array): Стандартные отклонения для второй колонки (оси x)
+        std_col3 (array): Стандартные отклонения для третьей колонки (оси y)
+        row_counts (list): Пары количеств строк для каждого файла или None
+        max_entries (int): Максимальное количество записей в кэше (по умолчанию 100)
+    """
+    cache_dir = Path(cache_dir)
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        counts = np.array([(-1, -1) if c is None else c for c in row_counts], dtype=np.int64).reshape(-1, 2)
+        cache_path = cache_dir / f"{key}.npz"
+        tmp_path = cache_dir / f"{key}.npz.{os.getpid()}.tmp"
+        # Запись через временный файл: прерванная запись не оставляет обрезанный архив
+        with open(tmp_path, "wb") as f:
+            np.savez(f,
+                     std_col2=np.asarray(std_col2, dtype=np.float64),
+                     std_col3=np.asarray(std_col3, dtype=np.float64),
+                     row_counts=counts)
+        os.replace(tmp_path, cache_path)
+        _evict_old_entries(cache_dir, "*.npz", max_entries)
+    except OSError as e:
+        # Кэш не обязателен: ошибка записи не должна прерывать расчёт
+        print(f"Не удалось сохранить кэш результатов: {e}")
+
+
+def _frame_cache_path(cache_dir, file_path):
+    """Путь к записи кэша для прочитанного листа файла file_path"""
+    key = hashlib.blake2b(f"v{CACHE_VERSION}|".encode("utf-8") + _file_signature(file_path),
+                          digest_size=16).hexdigest()
+    return Path(cache_dir) / "frames" / f"{key}.npy"
+
+
+def load_frame(cache_dir, file_path):
+    """
+    Загружает из кэша прочитанный лист Excel-файла
+
+    Args:
+        cache_dir (str or Path): Папка кэша
+        file_path (str): Путь к Excel-файлу
+
+    Returns:
+        array or None: Данные листа (float64) или None, если записи нет или файл изменился
+    """
+    try:
+        cache_path = _frame_cache_path(cache_dir, file_path)
+        data = np.load(cache_path, allow_pickle=False)
+        # Обновляем время изменения для вытеснения давно не использованных записей;
+        # запись может быть удалена другим процессом между чтением и этим вызовом
+        os.utime(cache_path)
+    except (OSError, ValueError, EOFError):
+        # Нет записи или она повреждена (например, пустой файл)
+        return None
+    return data
+
+
+def save_frame(cache_dir, file_path, data, max_entries=100):
+    """
+    Сохраняет прочитанный лист Excel-файла в кэш
+
+    Args:
+        cache_dir (str or Path): Папка кэша
+        file_path (str): Путь к Excel-файлу
+        data (array): Данные листа
+        max_entries (int): Максимальное количество листов в кэше (по умолчанию 100)
+    """
+    try:
+        cache_path = _frame_cache_path(cache_dir, file_path)
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        # Запись через временный файл: листы пишут параллельно несколько процессов,
+        # читатель не должен увидеть недописанный файл
+        tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.asarray(data, dtype=np.float64), allow_pickle=False)
+        os.replace(tmp_path, cache_path)
+        _evict_old_entries(cache_path.parent, "*.npy", max_entries)
+    except OSError:
+        # Кэш не обязателен: без него файл просто будет прочитан заново
+        pass
@@ -1,14 +1,80 @@
 """
 Модуль для визуализации результатов анализа данных эмиттанса.
 Содержит функции для построения графиков зависимостей.
+matplotlib импортируется внутри функций построения графиков, поэтому импорт модуля
+(например, ради print_results_summary) не загружает matplotlib и не выбирает бэкенд.
 """
 
-import matplotlib.pyplot as plt
 import numpy as np
 
 
+# При большем числе точек подписываются только минимум и максимум
+MAX_ANNOTATED_POINTS = 50
+
+# Форматирование значений с шестью знаками после запятой (подписи точек и сводка)
+_FMT6 = '{:.6f}'.format
+
+
+def _annotate_points(ax, x_values, y_values, annotate_all=True):
+    """
+    Подписывает значения точек на графике. Подписи создаются как простые Text
+    (ax.text со смещением на 10 пунктов вверх), без механизма стрелок annotate.
+    
+    Args:
+        ax (Axes): Оси, на которых подписываются точки
+        x_values (list): Координаты точек по оси X
+        y_values (list): Координаты точек по оси Y (подписываемые значения)
+        annotate_all (bool): Подписывать все точки; если False или точек больше
+            MAX_ANNOTATED_POINTS — только минимум и максимум
+    """
+    if len(y_values) == 0:
+        return
+    if annotate_all and len(y_values) <= MAX_ANNOTATED_POINTS:
+        indices = range(len(y_values))
+    else:
+        indices = sorted({int(np.argmin(y_values)), int(np.argmax(y_values))})
+    from matplotlib.transforms import offset_copy
+    transform = offset_copy(ax.transData, fig=ax.figure, y=10, units='points')
+    for i in indices:
+        ax.text(x_values[i], y_values[i], _FMT6(y_values[i]), transform=transform,
+                ha='center', fontsize=9)
+
+
+def _new_figure(show_plot, ncols=1, figsize=(10, 6)):
+    """
+    Создаёт фигуру с ncols осями в одну строку. Если график не показывается на экране,
+    фигура строится напрямую на холсте Agg, без pyplot: она не регистрируется
+    в менеджере фигур и не требует интерактивного бэкенда
+    
+    Returns:
+        tuple: (fig, axes), где axes — одни оси при ncols=1 или массив осей
+    """
+    if show_plot:
+        import matplotlib.pyplot as plt
+        return plt.subplots(1, ncols, figsize=figsize)
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig, fig.subplots(1, ncols)
+
+
+def _finish_figure(fig, save_path, show_plot):
+    """
+    Сохраняет и при необходимости показывает фигуру (созданную _new_figure)
+    """
+    if save_path:
+        # Поля уже подогнаны tight_layout, поэтому bbox_inches='tight' (второй проход
+        # отрисовки) не нужен
+        fig.savefig(save_path, dpi=300)
+        print(f"График сохранен в: {save_path}")
+    if show_plot:
+        import matplotlib.pyplot as plt
+        plt.show()
+
+
 def plot_weighted_std_dependencies(field_values, weighted_std_col2, weighted_std_col3, 
-                                  save_path=None, show_plot=True):
+                                  save_path=None, show_plot=True, annotate_all=True):
     """
     Строит графики зависимости взвешенного стандартного отклонения от field
     
@@ -18,36 +84,29 @@ def plot_weighted_std_dependencies(field_values, weighted_std_col2, weighted_std
         weighted_std_col3 (list): Взвешенные стандартные отклонения для третьей колонки
         save_path (str, optional): Путь для сохранения графика
         show_plot (bool): Показывать ли график на экране (по умолчанию True)
+        annotate_all (bool): Подписывать значения всех точек; если False — только минимума и максимума
     """
-    plt.figure(figsize=(12, 5))
-    plt.subplot(1, 2, 1)
-    plt.plot(field_values, weighted_std_col2, 'bo-', linewidth=2, markersize=8)
-    plt.xlabel('Field')
-    plt.ylabel('Взвешенное стандартное отклонение\nрасстояний (м) (для второй колонки)')
-    plt.title('Зависимость взвешенного стандартного отклонения\nрасстояний от field (колонка 2)')
-    plt.grid(True, alpha=0.3)
-    for x, y in zip(field_values, weighted_std_col2):
-        plt.annotate(f'{y:.6f}', (x, y), textcoords="offset points", xytext=(0,10), ha='center', fontsize=9)
-    plt.subplot(1, 2, 2)
-    plt.plot(field_values, weighted_std_col3, 'ro-', linewidth=2, markersize=8)
-    plt.xlabel('Field')
-    plt.ylabel('Взвешенное стандартное отклонение\nрасстояний (м) (для третьей колонки)')
-    plt.title('Зависимость взвешенного стандартного отклонения\nрасстояний от field (колонка 3)')
-    plt.grid(True, alpha=0.3)
-    for x, y in zip(field_values, weighted_std_col3):
-        plt.annotate(f'{y:.6f}', (x, y), textcoords="offset points", xytext=(0,10), ha='center', fontsize=9)
-    plt.tight_layout()
-    if save_path:
-        plt.savefig(save_path, dpi=300, bbox_inches='tight')
-        print(f"График сохранен в: {save_path}")
-    if show_plot:
-        plt.show()
+    fig, (ax1, ax2) = _new_figure(show_plot, ncols=2, figsize=(12, 5))
+    ax1.plot(field_values, weighted_std_col2, 'bo-', linewidth=2, markersize=8)
+    ax1.set_xlabel('Field')
+    ax1.set_ylabel('Взвешенное стандартное отклонение\nрасстояний (м) (для второй колонки)')
+    ax1.set_title('Зависимость взвешенного стандартного отклонения\nрасстояний от field (колонка 2)')
+    ax1.grid(True, alpha=0.3)
+    _annotate_points(ax1, field_values, weighted_std_col2, annotate_all)
+    ax2.plot(field_values, weighted_std_col3, 'ro-', linewidth=2, markersize=8)
+    ax2.set_xlabel('Field')
+    ax2.set_ylabel('Взвешенное стандартное отклонение\nрасстояний (м) (для третьей колонки)')
+    ax2.set_title('Зависимость взвешенного стандартного отклонения\nрасстояний от field (колонка 3)')
+    ax2.grid(True, alpha=0.3)
+    _annotate_points(ax2, field_values, weighted_std_col3, annotate_all)
+    fig.tight_layout()
+    _finish_figure(fig, save_path, show_plot)
     print("Графики построены и отображены!")
 
 
 def plot_std_vs_w_with_approximation(w_values, weighted_std_col2, weighted_std_col3, 
                                     emittance_x_result, emittance_y_result,
-                                    save_path=None, show_plot=True):
+                                    save_path=None, show_plot=True, annotate_all=True):
     """
     Строит графики зависимости стандартного отклонения от параметра w с аппроксимирующими параболами
     
@@ -59,42 +118,35 @@ def plot_std_vs_w_with_approximation(w_values, weighted_std_col2, weighted_std_c
         emittance_y_result (dict): Результаты аппроксимации для оси y
         save_path (str, optional): Путь для сохранения графика
         show_plot (bool): Показывать ли график на экране (по умолчанию True)
+        annotate_all (bool): Подписывать значения всех точек; если False — только минимума и максимума
     """
-    plt.figure(figsize=(12, 5))
-    plt.subplot(1, 2, 1)
-    plt.plot(w_values, weighted_std_col2, 'bo-', linewidth=2, markersize=8, label='Фактические значения')
+    # Общая сетка для построения обеих парабол
+    w_smooth = np.linspace(np.min(w_values), np.max(w_values), 100)
+    fig, (ax1, ax2) = _new_figure(show_plot, ncols=2, figsize=(12, 5))
+    ax1.plot(w_values, weighted_std_col2, 'bo-', linewidth=2, markersize=8, label='Фактические значения')
     if emittance_x_result:
         a, b, c = emittance_x_result['parameters']
-        w_smooth = np.linspace(min(w_values), max(w_values), 100)
-        std_predicted_smooth = a * w_smooth**2 + b * w_smooth + c
-        plt.plot(w_smooth, std_predicted_smooth, 'r--', linewidth=2, label=f'Аппроксимация: {a:.2f}w² + {b:.2f}w + {c:.2f}')
-    plt.xlabel('Параметр w')
-    plt.ylabel('Взвешенное стандартное отклонение\nрасстояний (м) (ось X)')
-    plt.title('Зависимость стандартного отклонения от w\nс параболической аппроксимацией (ось X)')
-    plt.grid(True, alpha=0.3)
-    plt.legend()
-    for x, y in zip(w_values, weighted_std_col2):
-        plt.annotate(f'{y:.6f}', (x, y), textcoords="offset points", xytext=(0,10), ha='center', fontsize=9)
-    plt.subplot(1, 2, 2)
-    plt.plot(w_values, weighted_std_col3, 'go-', linewidth=2, markersize=8, label='Фактические значения')
+        std_predicted_smooth = np.polyval((a, b, c), w_smooth)
+        ax1.plot(w_smooth, std_predicted_smooth, 'r--', linewidth=2, label=f'Аппроксимация: {a:.2f}w² + {b:.2f}w + {c:.2f}')
+    ax1.set_xlabel('Параметр w')
+    ax1.set_ylabel('Взвешенное стандартное отклонение\nрасстояний (м) (ось X)')
+    ax1.set_title('Зависимость стандартного отклонения от w\nс параболической аппроксимацией (ось X)')
+    ax1.grid(True, alpha=0.3)
+    ax1.legend()
+    _annotate_points(ax1, w_values, weighted_std_col2, annotate_all)
+    ax2.plot(w_values, weighted_std_col3, 'go-', linewidth=2, markersize=8, label='Фактические значения')
     if emittance_y_result:
         a, b, c = emittance_y_result['parameters']
-        w_smooth = np.linspace(min(w_values), max(w_values), 100)
-        std_predicted_smooth = a * w_smooth**2 + b * w_smooth + c
-        plt.plot(w_smooth, std_predicted_smooth, 'm--', linewidth=2, label=f'Аппроксимация: {a:.2f}w² + {b:.2f}w + {c:.2f}')
-    plt.xlabel('Параметр w')
-    plt.ylabel('Взвешенное стандартное отклонение\nрасстояний (м) (ось Y)')
-    plt.title('Зависимость стандартного отклонения от w\nс параболической аппроксимацией (ось Y)')
-    plt.grid(True, alpha=0.3)
-    plt.legend()
-    for x, y in zip(w_values, weighted_std_col3):
-        plt.annotate(f'{y:.6f}', (x, y), textcoords="offset points", xytext=(0,10), ha='center', fontsize=9)
-    plt.tight_layout()
-    if save_path:
-        plt.savefig(save_path, dpi=300, bbox_inches='tight')
-        print(f"График сохранен в: {save_path}")
-    if show_plot:
-        plt.show()
+        std_predicted_smooth = np.polyval((a, b, c), w_smooth)
+        ax2.plot(w_smooth, std_predicted_smooth, 'm--', linewidth=2, label=f'Аппроксимация: {a:.2f}w² + {b:.2f}w + {c:.2f}')
+    ax2.set_xlabel('Параметр w')
+    ax2.set_ylabel('Взвешенное стандартное отклонение\nрасстояний (м) (ось Y)')
+    ax2.set_title('Зависимость стандартного отклонения от w\nс параболической аппроксимацией (ось Y)')
+    ax2.grid(True, alpha=0.3)
+    ax2.legend()
+    _annotate_points(ax2, w_values, weighted_std_col3, annotate_all)
+    fig.tight_layout()
+    _finish_figure(fig, save_path, show_plot)
     print("Графики зависимости от w построены и отображены!")
 
 
@@ -111,35 +163,28 @@ def plot_approximation_comparison(field_values, actual_values, approximated_valu
         save_path (str, optional): Путь для сохранения графика
         show_plot (bool): Показывать ли график на экране (по умолчанию True)
     """
-    plt.figure(figsize=(10, 6))
+    fig, ax = _new_figure(show_plot, figsize=(10, 6))
     
     # Построение фактических значений
-    plt.plot(field_values, actual_values, 'bo-', linewidth=2, markersize=8, 
-             label='Фактические значения')
+    ax.plot(field_values, actual_values, 'bo-', linewidth=2, markersize=8, 
+            label='Фактические значения')
     
     # Построение аппроксимированных значений
-    plt.plot(field_values, approximated_values, 'r--', linewidth=2, 
-             label='Аппроксимация')
+    ax.plot(field_values, approximated_values, 'r--', linewidth=2,
+            label='Аппроксимация')
     
-    plt.xlabel('Field')
-    plt.ylabel('Взвешенное стандартное отклонение расстояний')
-    plt.title(title)
-    plt.grid(True, alpha=0.3)
-    plt.legend()
+    ax.set_xlabel('Field')
+    ax.set_ylabel('Взвешенное стандартное отклонение расстояний')
+    ax.set_title(title)
+    ax.grid(True, alpha=0.3)
+    ax.legend()
     
     # Добавление значений на точки
-    for i, (x, y) in enumerate(zip(field_values, actual_values)):
-        plt.annotate(f'{y:.6f}', (x, y), textcoords="offset points", 
-                    xytext=(0,10), ha='center', fontsize=9)
+    _annotate_points(ax, field_values, actual_values)
+    fig.tight_layout()
     
-    # Сохранение графика, если указан путь
-    if save_path:
-        plt.savefig(save_path, dpi=300, bbox_inches='tight')
-        print(f"График сохранен в: {save_path}")
-    
-    # Показ графика
-    if show_plot:
-        plt.show()
+    # Сохранение и показ графика
+    _finish_figure(fig, save_path, show_plot)
 
 
 def print_results_summary(field_values, weighted_std_col2, weighted_std_col3):
@@ -151,9 +196,13 @@ def print_results_summary(field_values, weighted_std_col2, weighted_std_col3):
         weighted_std_col2 (list): Взвешенные стандартные отклонения для второй колонки (в метрах)
         weighted_std_col3 (list): Взвешенные стандартные отклонения для третьей колонки (в метрах)
     """
-    print("\n" + "=" * 50)
-    print("РЕЗУЛЬТАТЫ:")
-    print(f"Значения field: {field_values}")
-    print(f"Взвешенные стандартные отклонения расстояний для второй колонки (м): {[f'{x:.6f}' for x in weighted_std_col2]}")
-    print(f"Взвешенные стандартные отклонения расстояний для третьей колонки (м): {[f'{x:.6f}' for x in weighted_std_col3]}")
-    print("\n" + "=" * 50) 
\ No newline at end of file
+    # Сводка собирается в одну строку и выводится одним вызовом print
+    lines = [
+        "\n" + "=" * 50,
+        "РЕЗУЛЬТАТЫ:",
+        f"Значения field: {field_values}",
+        f"Взвешенные стандартные отклонения расстояний для второй колонки (м): {list(map(_FMT6, weighted_std_col2))}",
+        f"Взвешенные стандартные отклонения расстояний для третьей колонки (м): {list(map(_FMT6, weighted_std_col3))}",
+        "\n" + "=" * 50,
+    ]
+    print("\n".join(lines)) 
\ No newline at end of file